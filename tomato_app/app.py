@@ -1,6 +1,20 @@
 from flask import Flask, render_template, request, send_file, jsonify
-from predict import load_model, predict_image
+from predict import predict_image, class_names, load_runtime_config, apply_runtime_config
+from model_registry import ModelRegistry
+from prediction_cache import PredictionCache, file_hash
+from history import PredictionHistory
+from derivatives import create_derivatives, derived_path
+from explain import ActivationCache, gradcam, render_overlay
+from severity import adjust_severity
+from profiling import profiler
+from tta import tta
+from video import allowed_video_file, iter_frames, analyze_frames
+from torch.profiler import record_function
 import os
+import atexit
+import hmac
+import time
+import torch
 from datetime import datetime
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage, Table, TableStyle
@@ -11,13 +25,100 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT
 import uuid
 
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = 'static/uploads'
+app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', 'static/uploads')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MODEL_REGISTRY'] = os.environ.get('MODEL_REGISTRY', 'model_registry')
+app.config['HISTORY_DB'] = os.environ.get('HISTORY_DB', 'predictions.db')
 
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-model = load_model()
+# Apply tuned threading before the model touches any thread pool
+runtime_config = load_runtime_config()
+apply_runtime_config(runtime_config)
+
+registry = ModelRegistry(app.config['MODEL_REGISTRY'])
+registry.load_active()
+prediction_cache = PredictionCache()
+activation_cache = ActivationCache()
+history = PredictionHistory(app.config['HISTORY_DB'])
+atexit.register(history.close)
+
+if not os.environ.get('ADMIN_TOKEN'):
+    print("WARNING: ADMIN_TOKEN is not set; /admin endpoints are disabled")
+
+def run_prediction(image_path, active=None):
+    # Hold on to one (version, model) pair for the whole request so a
+    # concurrent swap never mixes versions within a result
+    model_version, model = active or registry.get()
+    image_hash = file_hash(image_path)
+
+    result = prediction_cache.get(image_hash, model_version)
+    if result is None:
+        result, activations = predict_image(image_path, model, return_activations=True)
+        result['model_version'] = model_version
+        result['image_hash'] = image_hash
+        prediction_cache.put(image_hash, model_version, result)
+        activation_cache.put(image_hash, model_version, activations.cpu())
+        registry.maybe_shadow(image_path, result)
+
+    return result
+
+def explain_images(image_paths):
+    """
+    Heatmap Grad-CAM kelas teratas untuk beberapa gambar dalam satu backward pass
+    """
+    active = registry.get()
+    model_version, model = active
+    results = [run_prediction(path, active) for path in image_paths]
+
+    pending = [i for i, result in enumerate(results)
+               if not (result.get('heatmap_path') and os.path.exists(result['heatmap_path']))]
+    if not pending:
+        return results
+
+    start = time.perf_counter()
+    activations = []
+    reused = 0
+    for i in pending:
+        cached = activation_cache.get(results[i]['image_hash'], model_version)
+        if cached is None:
+            # Evicted since the prediction was made; redo the forward pass
+            _, cached = predict_image(image_paths[i], model, return_activations=True, tta_source=None,
+                                      profile=False)
+        else:
+            reused += 1
+        activations.append(cached)
+
+    class_indices = [class_names.index(results[i]['prediction']) for i in pending]
+    cams = gradcam(model, torch.cat(activations), class_indices)
+    gradcam_ms = (time.perf_counter() - start) * 1000
+
+    for i, cam in zip(pending, cams):
+        overlay_start = time.perf_counter()
+        display_path = create_derivatives(image_paths[i])['display']
+        heatmap_path = render_overlay(display_path, cam, derived_path(image_paths[i], f"gradcam_{model_version}.jpg"))
+
+        result = results[i]
+        result['heatmap_path'] = heatmap_path
+        result['explain_timing'] = {
+            'gradcam_ms': gradcam_ms,
+            'batch_size': len(pending),
+            'activations_reused': reused,
+            'overlay_ms': (time.perf_counter() - overlay_start) * 1000,
+        }
+        # Keep the overlay with the cached prediction
+        prediction_cache.put(result['image_hash'], model_version, result)
+
+    return results
+
+def admin_authorized():
+    token = os.environ.get('ADMIN_TOKEN')
+    # No token, no admin API: behind a local reverse proxy every client
+    # would look like localhost
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
 
 @app.route("/", methods=["GET", "POST"])
 def index():
@@ -35,14 +136,22 @@ def index():
             image_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
             image.save(image_path)
             
-            # Get prediction results
-            result = predict_image(image_path, model)
+            # Get prediction results, with a Grad-CAM heatmap only when asked
+            if request.form.get('explain'):
+                result = explain_images([image_path])[0]
+            else:
+                result = run_prediction(image_path)
             
             # Add image path to result
+            derivatives = create_derivatives(image_path)
             result['image_path'] = image_path
+            result['display_path'] = derivatives['display']
+            result['thumbnail_path'] = derivatives['thumbnail']
             result['filename'] = filename
             result['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
+            history.record(result)
+            
             return jsonify(result)
     
     return render_template("index.html")
@@ -53,22 +162,217 @@ def download_report(filename):
     if not os.path.exists(image_path):
         return "File not found", 404
     
-    # Get prediction results again for PDF
-    result = predict_image(image_path, model)
+    # Reuse the cached prediction for this image and model version
+    include_heatmap = bool(request.args.get('heatmap'))
+    if include_heatmap:
+        result = explain_images([image_path])[0]
+    else:
+        result = run_prediction(image_path)
     
     # Generate PDF
     pdf_filename = f"tomato_disease_report_{filename.split('.')[0]}.pdf"
     pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], pdf_filename)
     
-    generate_pdf_report(result, image_path, pdf_path)
+    # Embed the display-size copy rather than the original photo
+    derivatives = create_derivatives(image_path)
+    generate_pdf_report(result, derivatives['display'], pdf_path,
+                        heatmap_path=result.get('heatmap_path') if include_heatmap else None)
     
     return send_file(pdf_path, as_attachment=True, download_name=pdf_filename)
 
+def explain_summary(filename, result):
+    return {
+        'filename': filename,
+        'prediction': result['prediction'],
+        'model_version': result['model_version'],
+        'heatmap_path': result['heatmap_path'],
+        'explain_timing': result.get('explain_timing'),
+    }
+
+def is_upload_name(name):
+    # A bare file name inside UPLOAD_FOLDER, never a path out of it
+    return isinstance(name, str) and name not in ('', '.', '..') and os.path.basename(name) == name
+
+@app.route("/explain/<filename>")
+def explain(filename):
+    if not is_upload_name(filename):
+        return jsonify({'error': 'Invalid filename'}), 400
+    image_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if not os.path.isfile(image_path):
+        return jsonify({'error': 'File not found'}), 404
+
+    result = explain_images([image_path])[0]
+    return jsonify(explain_summary(filename, result))
+
+@app.route("/explain", methods=["POST"])
+def explain_batch():
+    filenames = (request.get_json(silent=True) or {}).get('filenames') or []
+    if not isinstance(filenames, list) or not filenames or len(filenames) > 32:
+        return jsonify({'error': 'Provide between 1 and 32 filenames'}), 400
+    invalid = [name for name in filenames if not is_upload_name(name)]
+    if invalid:
+        return jsonify({'error': 'Invalid filename', 'filenames': invalid}), 400
+
+    image_paths = [os.path.join(app.config['UPLOAD_FOLDER'], name) for name in filenames]
+    missing = [name for name, path in zip(filenames, image_paths) if not os.path.isfile(path)]
+    if missing:
+        return jsonify({'error': 'File not found', 'filenames': missing}), 404
+
+    results = explain_images(image_paths)
+    return jsonify({'results': [explain_summary(name, result) for name, result in zip(filenames, results)]})
+
+@app.route("/analyze_video", methods=["POST"])
+def analyze_video():
+    video = request.files.get('video')
+    if not video or video.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    if not allowed_video_file(video.filename):
+        return jsonify({'error': 'Unsupported video or sequence format'}), 400
+
+    filename = str(uuid.uuid4()) + '_' + video.filename
+    video_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    video.save(video_path)
+
+    model_version, model = registry.get()
+    try:
+        result = analyze_frames(
+            iter_frames(video_path, request.form.get('sample_fps', 2.0, type=float)),
+            model,
+            batch_size=runtime_config.get('batch_size', 8),
+            change_threshold=request.form.get('change_threshold', 0.04, type=float),
+        )
+    except (ValueError, RuntimeError, OSError) as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        # Frames are analysed while streaming; the upload itself is not kept
+        os.remove(video_path)
+
+    result['model_version'] = model_version
+    result['filename'] = video.filename
+    return jsonify(result)
+
+@app.route("/history")
+def prediction_history():
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+
+    records = history.query(
+        limit=limit,
+        offset=offset,
+        predicted_class=request.args.get('class'),
+        since=request.args.get('since'),
+        until=request.args.get('until'),
+        image_hash=request.args.get('hash'),
+    )
+    return jsonify({'records': records, 'limit': limit, 'offset': offset})
+
+@app.route("/history/stats")
+def prediction_history_stats():
+    daily = history.daily_class_counts(
+        since=request.args.get('since'),
+        until=request.args.get('until'),
+    )
+
+    totals = {}
+    for row in daily:
+        totals[row['predicted_class']] = totals.get(row['predicted_class'], 0) + row['count']
+
+    return jsonify({'daily': daily, 'totals': totals, 'dropped_writes': history.dropped})
+
+@app.route("/admin/models", methods=["GET"])
+def admin_models():
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(registry.status())
+
+@app.route("/admin/models/activate", methods=["POST"])
+def admin_activate_model():
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    version = (request.get_json(silent=True) or {}).get('version')
+    try:
+        previous = registry.activate(version)
+    except KeyError:
+        return jsonify({'error': f'Unknown model version: {version}'}), 404
+
+    return jsonify({'active': version, 'previous': previous})
+
+@app.route("/admin/models/shadow", methods=["POST", "DELETE"])
+def admin_shadow_model():
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    if request.method == "DELETE":
+        registry.clear_shadow()
+        return jsonify(registry.status())
+
+    data = request.get_json(silent=True) or {}
+    version = data.get('version')
+    try:
+        sample_rate = float(data.get('sample_rate', 0.1))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'sample_rate must be a number'}), 400
+    if not 0 < sample_rate <= 1:
+        return jsonify({'error': 'sample_rate must be in (0, 1]'}), 400
+
+    try:
+        registry.set_shadow(version, sample_rate)
+    except KeyError:
+        return jsonify({'error': f'Unknown model version: {version}'}), 404
+
+    return jsonify(registry.status())
+
+@app.route("/admin/profiling", methods=["GET", "POST"])
+def admin_profiling():
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        try:
+            every_n = int(data.get('every_n', 0))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'every_n must be an integer'}), 400
+        if every_n < 0:
+            return jsonify({'error': 'every_n must be >= 0'}), 400
+        # The output folder comes only from PROFILE_DIR, never from the request
+        profiler.configure(every_n=every_n)
+
+    return jsonify(profiler.status())
+
+@app.route("/admin/tta", methods=["GET", "POST"])
+def admin_tta():
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        bands = {}
+        for key in ('confidence_band', 'entropy_band'):
+            band = data.get(key)
+            if band is None:
+                continue
+            try:
+                low, high = (float(v) for v in band)
+            except (TypeError, ValueError):
+                return jsonify({'error': f'{key} must be a [low, high] pair of numbers'}), 400
+            if low > high:
+                return jsonify({'error': f'{key} low must not exceed high'}), 400
+            bands[key] = (low, high)
+        tta.configure(enabled=data.get('enabled'), **bands)
+
+    return jsonify(tta.status())
+
 def allowed_file(filename):
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def generate_pdf_report(result, image_path, pdf_path):
+@profiler.profiled('generate_pdf_report')
+def generate_pdf_report(result, image_path, pdf_path, heatmap_path=None):
     doc = SimpleDocTemplate(pdf_path, pagesize=A4)
     styles = getSampleStyleSheet()
     story = []
@@ -117,6 +421,13 @@ def generate_pdf_report(result, image_path, pdf_path):
         story.append(Paragraph("Gambar tidak dapat dimuat", styles['Normal']))
         story.append(Spacer(1, 20))
     
+    # Grad-CAM heatmap
+    if heatmap_path:
+        story.append(Paragraph("Peta Aktivasi (Grad-CAM)", subheader_style))
+        story.append(RLImage(heatmap_path, width=4*inch, height=3*inch))
+        story.append(Paragraph("Area berwarna merah adalah bagian daun yang paling memengaruhi diagnosis.", styles['Normal']))
+        story.append(Spacer(1, 20))
+    
     # Prediction Results
     story.append(Paragraph("Hasil Deteksi", header_style))
     
@@ -169,6 +480,8 @@ def generate_pdf_report(result, image_path, pdf_path):
     
     # Disease Information
     disease_info = result.get('disease_info', {})
+    severity_estimate = result.get('severity_estimate') or {}
+    lesion_percent = severity_estimate.get('lesion_area_percent')
     if disease_info:
         story.append(Paragraph("Informasi Lengkap Penyakit", header_style))
         
@@ -228,6 +541,8 @@ def generate_pdf_report(result, image_path, pdf_path):
         if disease_info.get('severity'):
             story.append(Paragraph("Tingkat Keparahan:", subheader_style))
             severity_text = f"<b>{disease_info['severity']}</b>"
+            if lesion_percent is not None:
+                severity_text += f"<br/>Luas area lesi pada gambar: <b>{lesion_percent:.1f}%</b> ({severity_estimate['level']})"
             story.append(Paragraph(severity_text, styles['Normal']))
             story.append(Spacer(1, 10))
         
@@ -255,9 +570,9 @@ def generate_pdf_report(result, image_path, pdf_path):
                         story.append(Paragraph(f"• {condition}", styles['Normal']))
                 story.append(Spacer(1, 10))
     
-    # Recommendations based on severity
+    # Recommendations based on severity, adjusted for the lesion area in this image
     story.append(Paragraph("Rekomendasi Tindakan:", header_style))
-    severity = disease_info.get('severity', '')
+    severity = adjust_severity(disease_info.get('severity', ''), lesion_percent)
     
     if not is_likely_tomato:
         story.append(Paragraph("<b>GAMBAR TIDAK VALID - BUKAN DAUN TOMAT</b>", 
@@ -326,7 +641,13 @@ def generate_pdf_report(result, image_path, pdf_path):
     story.append(Paragraph("Sistem ini dikembangkan untuk membantu petani dalam deteksi dini penyakit tanaman.", 
                           styles['Italic']))
     
-    doc.build(story)
+    with record_function("reportlab_build"):
+        doc.build(story)
 
 if __name__ == "__main__":
+    workers = runtime_config.get('workers', 1)
+    if workers > 1:
+        # The development server is a single process; the tuned worker count
+        # is meant for the process manager (e.g. gunicorn -w) in production
+        print(f"Runtime config was tuned for {workers} worker processes")
     app.run(debug=True)
@@ -0,0 +1,204 @@
+"""
+Autotune konfigurasi threading CPU untuk runtime inferensi.
+
+Benchmark model (dari load_model) untuk kombinasi thread intra-op, thread
+inter-op, jumlah worker process dan batch size pada mesin ini, lalu simpan
+konfigurasi dengan throughput terbaik yang memenuhi target latensi p99 ke
+runtime_config.json (dibaca oleh app.py saat startup).
+
+Contoh:
+    python autotune.py --p99-ms 150
+    python autotune.py --intra 1,2,4 --workers 1,2 --batch-sizes 1,8
+"""
+import os
+import json
+import time
+import argparse
+import itertools
+import multiprocessing as mp
+from queue import Empty
+from datetime import datetime
+
+import numpy as np
+
+from predict import RUNTIME_CONFIG_PATH
+
+
+def _powers_of_two(limit):
+    values = []
+    n = 1
+    while n <= limit:
+        values.append(n)
+        n *= 2
+    if values[-1] != limit:
+        values.append(limit)
+    return values
+
+def _parse_list(text):
+    return [int(v) for v in text.split(',') if v.strip()]
+
+def _bench_worker(model_path, intra, inter, batch_size, warmup, iterations, barrier, queue, timeout):
+    # Threads must be set before torch runs anything in this process
+    import torch
+    torch.set_num_threads(intra)
+    torch.set_num_interop_threads(inter)
+
+    from predict import load_model, device
+    model = load_model(model_path)
+    inputs = torch.randn(batch_size, 3, 224, 224, device=device)
+
+    with torch.inference_mode():
+        for _ in range(warmup):
+            model(inputs)
+
+        # Start all workers together so they really compete for the cores;
+        # a crashed partner breaks the barrier instead of hanging us
+        barrier.wait(timeout)
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(iterations):
+            t = time.perf_counter()
+            model(inputs)
+            latencies.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+
+    queue.put((latencies, elapsed))
+
+def benchmark(model_path, intra, inter, workers, batch_size, warmup=3, iterations=20, timeout=300.0):
+    """
+    Jalankan satu konfigurasi di process baru dan kembalikan statistiknya.
+    Worker yang crash atau melewati timeout membuat konfigurasi ditandai gagal.
+    """
+    # Inter-op threads can only be set once per process, so every
+    # configuration runs in freshly spawned workers
+    ctx = mp.get_context('spawn')
+    barrier = ctx.Barrier(workers)
+    queue = ctx.Queue()
+    procs = [
+        ctx.Process(target=_bench_worker,
+                    args=(model_path, intra, inter, batch_size, warmup, iterations, barrier, queue, timeout))
+        for _ in range(workers)
+    ]
+    for p in procs:
+        p.start()
+
+    config = {
+        'intra_op_threads': intra,
+        'inter_op_threads': inter,
+        'workers': workers,
+        'batch_size': batch_size,
+    }
+    outputs = []
+    error = None
+    deadline = time.monotonic() + timeout
+    while len(outputs) < workers:
+        try:
+            outputs.append(queue.get(timeout=1.0))
+        except Empty:
+            exitcodes = [p.exitcode for p in procs if p.exitcode not in (None, 0)]
+            if exitcodes:
+                error = f"worker exited with code {exitcodes[0]}"
+            elif time.monotonic() > deadline:
+                error = f"timed out after {timeout:.0f} s"
+            if error:
+                break
+
+    for p in procs:
+        if error and p.is_alive():
+            p.terminate()
+        p.join()
+    if error:
+        return dict(config, failed=True, error=error)
+
+    latencies = np.array([lat for lats, _ in outputs for lat in lats]) * 1000
+    wall = max(elapsed for _, elapsed in outputs)
+    images = workers * iterations * batch_size
+
+    return dict(
+        config,
+        failed=False,
+        throughput=images / wall,
+        p50_ms=float(np.percentile(latencies, 50)),
+        p99_ms=float(np.percentile(latencies, 99)),
+    )
+
+def select_best(results, p99_target_ms):
+    """
+    Pilih throughput tertinggi yang p99-nya di bawah target
+    """
+    results = [r for r in results if not r['failed']]
+    eligible = [r for r in results if r['p99_ms'] <= p99_target_ms]
+    if not eligible:
+        # Nothing meets the target: fall back to the lowest-latency config
+        return min(results, key=lambda r: r['p99_ms']), False
+    return max(eligible, key=lambda r: r['throughput']), True
+
+def main():
+    cpu_count = os.cpu_count() or 1
+
+    parser = argparse.ArgumentParser(description="Autotune CPU threading for tomato disease inference")
+    parser.add_argument('--model', default='best_model.pth', help="Checkpoint passed to load_model")
+    parser.add_argument('--output', default=RUNTIME_CONFIG_PATH, help="Where to write the runtime config")
+    parser.add_argument('--p99-ms', type=float, default=200.0, help="p99 latency target per batch in milliseconds")
+    parser.add_argument('--intra', type=_parse_list, default=_powers_of_two(cpu_count))
+    parser.add_argument('--inter', type=_parse_list, default=[1, 2])
+    parser.add_argument('--workers', type=_parse_list, default=_powers_of_two(cpu_count))
+    parser.add_argument('--batch-sizes', type=_parse_list, default=[1, 4, 8])
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=300.0,
+                        help="Seconds before a configuration whose workers hang is marked failed")
+    parser.add_argument('--allow-oversubscription', action='store_true',
+                        help="Also try configs where workers x intra-op threads exceeds the core count")
+    args = parser.parse_args()
+
+    grid = [
+        (intra, inter, workers, batch_size)
+        for intra, inter, workers, batch_size in itertools.product(args.intra, args.inter, args.workers, args.batch_sizes)
+        if args.allow_oversubscription or workers * intra <= cpu_count
+    ]
+    if not grid:
+        parser.error("No configuration fits on this machine; use --allow-oversubscription")
+
+    print(f"Benchmarking {len(grid)} configurations on {cpu_count} cores")
+    results = []
+    for i, (intra, inter, workers, batch_size) in enumerate(grid, 1):
+        result = benchmark(args.model, intra, inter, workers, batch_size,
+                           warmup=args.warmup, iterations=args.iterations, timeout=args.timeout)
+        results.append(result)
+        label = f"[{i}/{len(grid)}] intra={intra} inter={inter} workers={workers} batch={batch_size}"
+        if result['failed']:
+            print(f"{label} -> failed: {result['error']}")
+        else:
+            print(f"{label} -> {result['throughput']:.1f} img/s, p99 {result['p99_ms']:.1f} ms")
+
+    if all(r['failed'] for r in results):
+        parser.error("Every configuration failed; check that --model loads")
+
+    best, met_target = select_best(results, args.p99_ms)
+    if not met_target:
+        print(f"No configuration meets p99 <= {args.p99_ms} ms, using the lowest-latency one")
+
+    config = {
+        'intra_op_threads': best['intra_op_threads'],
+        'inter_op_threads': best['inter_op_threads'],
+        'workers': best['workers'],
+        'batch_size': best['batch_size'],
+        'throughput': best['throughput'],
+        'p99_ms': best['p99_ms'],
+        'p99_target_ms': args.p99_ms,
+        'met_target': met_target,
+        'cpu_count': cpu_count,
+        'tuned_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(config, f, indent=2)
+
+    print(f"Best: intra={best['intra_op_threads']} inter={best['inter_op_threads']} "
+          f"workers={best['workers']} batch={best['batch_size']} "
+          f"({best['throughput']:.1f} img/s, p99 {best['p99_ms']:.1f} ms)")
+    print(f"Saved runtime config to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Toolkit pruning struktural dan knowledge distillation untuk MobileNetV3.
+
+Untuk setiap rasio pruning: pangkas channel ekspansi tiap inverted residual
+block (beserta SE) dan hidden layer classifier berdasarkan magnitude bobot,
+fine-tune hasilnya dengan distillation dari best_model.pth, lalu simpan
+checkpoint yang bisa dimuat load_model. FLOPs, jumlah parameter, latensi
+dan akurasi validasi setiap rasio dilaporkan.
+
+Dataset memakai struktur yang sama dengan notebook training:
+<data-dir>/train/<kelas>/*.jpg dan <data-dir>/val/<kelas>/*.jpg
+
+Contoh:
+    python compress.py --data-dir tomato --ratios 0.25,0.5,0.75 --epochs 3
+"""
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import torch.optim as optim
+from torch.utils.data import DataLoader
+from torchvision import datasets, transforms
+from torchvision.ops.misc import SqueezeExcitation
+from torchvision.models._utils import _make_divisible
+from torchvision.models.mobilenetv3 import InvertedResidual
+
+from predict import class_names, build_model, load_model
+
+# Same preprocessing as the training notebook
+data_transforms = {
+    'train': transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.RandomHorizontalFlip(),
+        transforms.ToTensor(),
+        transforms.Normalize([0.485, 0.456, 0.406],
+                             [0.229, 0.224, 0.225])
+    ]),
+    'val': transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize([0.485, 0.456, 0.406],
+                             [0.229, 0.224, 0.225])
+    ]),
+}
+
+
+def _keep_count(channels, ratio, avoid=None):
+    keep = max(8, _make_divisible(channels * (1 - ratio), 8))
+    keep = min(keep, channels)
+    # A block whose expansion equals its input drops the expand conv,
+    # which would change the layer layout load_model expects
+    if keep == avoid:
+        keep = keep + 8 if keep + 8 <= channels else keep - 8
+    return keep
+
+def _top_indices(scores, count):
+    return torch.sort(torch.argsort(scores, descending=True)[:count]).values
+
+def prune_model(model, ratio):
+    """
+    Pangkas channel ekspansi dan hidden classifier, kembalikan model baru dan arch-nya
+    """
+    model = model.cpu()
+    expanded_channels = []
+    # features.<i> -> {original channel count: kept channel indices}
+    index_map = {}
+
+    for i, layer in enumerate(model.features):
+        if not isinstance(layer, InvertedResidual):
+            continue
+        layers = list(layer.block)
+        # [expand], depthwise, [squeeze-excitation], project
+        se = layers[-2] if isinstance(layers[-2], SqueezeExcitation) else None
+        depthwise = layers[-3] if se is not None else layers[-2]
+        project = layers[-1]
+        in_channels = layers[0][0].in_channels
+        channels = depthwise[0].out_channels
+
+        if channels == in_channels:
+            # No expand conv to shrink (first block); keep it as is
+            expanded_channels.append(channels)
+            continue
+
+        # Channel importance: depthwise BN scale times projection weight magnitude
+        scores = depthwise[1].weight.detach().abs() * project[0].weight.detach().abs().sum(dim=(0, 2, 3))
+        keep = _top_indices(scores, _keep_count(channels, ratio, avoid=in_channels))
+        index_map[f"features.{i}"] = {channels: keep}
+        expanded_channels.append(len(keep))
+
+        if se is not None:
+            squeeze = se.fc1.out_channels
+            new_squeeze = _make_divisible(len(keep) // 4, 8)
+            se_scores = se.fc1.weight.detach()[:, keep].abs().sum(dim=(1, 2, 3))
+            index_map[f"features.{i}"][squeeze] = _top_indices(se_scores, new_squeeze)
+
+    hidden = model.classifier[0].out_features
+    head_scores = model.classifier[0].weight.detach().abs().sum(dim=1) * model.classifier[3].weight.detach().abs().sum(dim=0)
+    keep_hidden = _top_indices(head_scores, _keep_count(hidden, ratio))
+    index_map['classifier'] = {hidden: keep_hidden}
+
+    arch = {'expanded_channels': expanded_channels, 'last_channel': len(keep_hidden)}
+    pruned = build_model(arch)
+
+    src_state = model.state_dict()
+    dst_state = pruned.state_dict()
+    for key, tensor in src_state.items():
+        target_shape = dst_state[key].shape
+        if tensor.shape != target_shape:
+            group = 'classifier' if key.startswith('classifier.') else '.'.join(key.split('.')[:2])
+            for dim, (src_size, dst_size) in enumerate(zip(tensor.shape, target_shape)):
+                if src_size != dst_size:
+                    tensor = tensor.index_select(dim, index_map[group][src_size])
+        dst_state[key] = tensor.clone()
+    pruned.load_state_dict(dst_state)
+
+    return pruned, arch
+
+def count_flops(model):
+    """
+    Hitung multiply-accumulate Conv2d dan Linear untuk satu gambar 224x224
+    """
+    macs = []
+
+    def conv_hook(module, inputs, output):
+        kernel = module.kernel_size[0] * module.kernel_size[1]
+        macs.append(output.numel() * (module.in_channels // module.groups) * kernel)
+
+    def linear_hook(module, inputs, output):
+        macs.append(module.in_features * module.out_features)
+
+    hooks = []
+    for module in model.modules():
+        if isinstance(module, nn.Conv2d):
+            hooks.append(module.register_forward_hook(conv_hook))
+        elif isinstance(module, nn.Linear):
+            hooks.append(module.register_forward_hook(linear_hook))
+
+    model.eval()
+    with torch.inference_mode():
+        model(torch.zeros(1, 3, 224, 224))
+    for hook in hooks:
+        hook.remove()
+
+    return sum(macs)
+
+def measure_latency(model, runs=30, warmup=5):
+    model.eval()
+    inputs = torch.randn(1, 3, 224, 224)
+    timings = []
+    with torch.inference_mode():
+        for _ in range(warmup):
+            model(inputs)
+        for _ in range(runs):
+            start = time.perf_counter()
+            model(inputs)
+            timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+def evaluate(model, dataloader, max_batches=None):
+    model.eval()
+    correct = total = 0
+    with torch.inference_mode():
+        for i, (inputs, labels) in enumerate(dataloader):
+            if max_batches and i >= max_batches:
+                break
+            preds = model(inputs).argmax(dim=1)
+            correct += (preds == labels).sum().item()
+            total += labels.size(0)
+    return correct / total if total else None
+
+def distill(student, teacher, dataloader, epochs=3, lr=1e-4, temperature=4.0, alpha=0.7, max_batches=None):
+    """
+    Fine-tune student dengan gabungan loss KL ke teacher dan cross-entropy ke label
+    """
+    teacher.eval()
+    optimizer = optim.Adam(student.parameters(), lr=lr)
+
+    for epoch in range(epochs):
+        student.train()
+        running_loss = 0.0
+        seen = 0
+        for i, (inputs, labels) in enumerate(dataloader):
+            if max_batches and i >= max_batches:
+                break
+            with torch.no_grad():
+                teacher_logits = teacher(inputs)
+
+            optimizer.zero_grad()
+            student_logits = student(inputs)
+            kd_loss = F.kl_div(
+                F.log_softmax(student_logits / temperature, dim=1),
+                F.softmax(teacher_logits / temperature, dim=1),
+                reduction='batchmean',
+            ) * temperature ** 2
+            loss = alpha * kd_loss + (1 - alpha) * F.cross_entropy(student_logits, labels)
+            loss.backward()
+            optimizer.step()
+
+            running_loss += loss.item() * inputs.size(0)
+            seen += inputs.size(0)
+
+        print(f"  Epoch {epoch + 1}/{epochs} distillation loss: {running_loss / max(seen, 1):.4f}")
+
+    student.eval()
+    return student
+
+def describe(model, val_loader, max_val_batches=None):
+    return {
+        'params': sum(p.numel() for p in model.parameters()),
+        'mflops': 2 * count_flops(model) / 1e6,
+        'latency_ms': measure_latency(model),
+        'accuracy': evaluate(model, val_loader, max_val_batches),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Structured pruning and distillation for the tomato classifier")
+    parser.add_argument('--data-dir', required=True, help="Dataset folder with train/ and val/ subfolders")
+    parser.add_argument('--teacher', default='best_model.pth')
+    parser.add_argument('--ratios', default='0.25,0.5,0.75', help="Comma-separated pruning ratios")
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--lr', type=float, default=1e-4)
+    parser.add_argument('--temperature', type=float, default=4.0)
+    parser.add_argument('--alpha', type=float, default=0.7, help="Weight of the distillation loss")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--max-batches', type=int, help="Cap training batches per epoch for quick CPU runs")
+    parser.add_argument('--max-val-batches', type=int)
+    parser.add_argument('--output-dir', default='pruned_models')
+    args = parser.parse_args()
+
+    image_datasets = {x: datasets.ImageFolder(os.path.join(args.data_dir, x), data_transforms[x])
+                      for x in ['train', 'val']}
+    if image_datasets['train'].classes != class_names:
+        parser.error("Dataset classes do not match predict.class_names")
+    dataloaders = {x: DataLoader(image_datasets[x], batch_size=args.batch_size,
+                                 shuffle=(x == 'train'), num_workers=2)
+                   for x in ['train', 'val']}
+
+    # The toolkit is meant to run on CPU, whatever predict.device is
+    teacher = load_model(args.teacher).cpu()
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    report = [dict(ratio=0.0, checkpoint=args.teacher, **describe(teacher, dataloaders['val'], args.max_val_batches))]
+    for ratio in [float(r) for r in args.ratios.split(',') if r.strip()]:
+        print(f"Pruning ratio {ratio}")
+        student, arch = prune_model(teacher, ratio)
+        student = distill(student, teacher, dataloaders['train'], epochs=args.epochs, lr=args.lr,
+                          temperature=args.temperature, alpha=args.alpha, max_batches=args.max_batches)
+
+        checkpoint_path = os.path.join(args.output_dir, f"pruned_r{int(ratio * 100):02d}.pth")
+        torch.save({'arch': arch, 'prune_ratio': ratio, 'state_dict': student.state_dict()}, checkpoint_path)
+        report.append(dict(ratio=ratio, checkpoint=checkpoint_path,
+                           **describe(student, dataloaders['val'], args.max_val_batches)))
+
+    with open(os.path.join(args.output_dir, 'compress_report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'Ratio':>6} {'Params':>10} {'MFLOPs':>9} {'Latency':>10} {'Accuracy':>9}")
+    for row in report:
+        accuracy = f"{row['accuracy'] * 100:.2f}%" if row['accuracy'] is not None else 'n/a'
+        print(f"{row['ratio']:>6.2f} {row['params']:>10,} {row['mflops']:>9.1f} {row['latency_ms']:>8.1f}ms {accuracy:>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+from PIL import Image, ImageOps, features
+
+DISPLAY_SIZE = 1024
+THUMBNAIL_SIZE = 256
+DERIVED_DIR = 'derived'
+
+# ReportLab embeds JPEG data as-is, so the display copy stays JPEG; the
+# thumbnail is only ever shown in the browser and can use WebP
+THUMBNAIL_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+THUMBNAIL_EXT = '.webp' if THUMBNAIL_FORMAT == 'WEBP' else '.jpg'
+
+
+def derivative_paths(image_path):
+    folder = os.path.join(os.path.dirname(image_path), DERIVED_DIR)
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    return {
+        'display': os.path.join(folder, f"{stem}_display.jpg"),
+        'thumbnail': os.path.join(folder, f"{stem}_thumb{THUMBNAIL_EXT}"),
+    }
+
+def derived_path(image_path, suffix):
+    folder = os.path.join(os.path.dirname(image_path), DERIVED_DIR)
+    os.makedirs(folder, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(folder, f"{stem}_{suffix}")
+
+def _save_atomic(image, path, image_format, **params):
+    tmp_path = path + '.tmp'
+    image.save(tmp_path, format=image_format, **params)
+    os.replace(tmp_path, path)
+
+def create_derivatives(image_path):
+    """
+    Buat gambar ukuran tampilan dan thumbnail sekali per upload
+    """
+    paths = derivative_paths(image_path)
+    if all(os.path.exists(p) for p in paths.values()):
+        return paths
+
+    os.makedirs(os.path.dirname(paths['display']), exist_ok=True)
+    with Image.open(image_path) as image:
+        # Let the JPEG decoder downscale while decoding instead of
+        # materialising the full-resolution photo
+        image.draft('RGB', (DISPLAY_SIZE, DISPLAY_SIZE))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+    image.thumbnail((DISPLAY_SIZE, DISPLAY_SIZE), Image.LANCZOS, reducing_gap=3.0)
+    _save_atomic(image, paths['display'], 'JPEG', quality=85, optimize=True, progressive=True)
+
+    image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS)
+    _save_atomic(image, paths['thumbnail'], THUMBNAIL_FORMAT, quality=80)
+
+    return paths
@@ -0,0 +1,77 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+
+from predict import device, classify_features
+
+
+class ActivationCache:
+    """
+    Cache LRU aktivasi layer fitur terakhir per (hash gambar, versi model)
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, image_hash, model_version):
+        key = (image_hash, model_version)
+        with self._lock:
+            activations = self._entries.get(key)
+            if activations is not None:
+                self._entries.move_to_end(key)
+            return activations
+
+    def put(self, image_hash, model_version, activations):
+        key = (image_hash, model_version)
+        with self._lock:
+            self._entries[key] = activations
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+def gradcam(model, activations, class_indices):
+    """
+    Grad-CAM dari aktivasi yang disimpan saat forward pass prediksi.
+    Backward hanya melewati pooling dan classifier, untuk banyak gambar
+    sekaligus (activations: N x C x H x W).
+    """
+    features = activations.detach().to(device).requires_grad_(True)
+    targets = torch.as_tensor(class_indices, device=device).view(-1, 1)
+
+    with torch.enable_grad():
+        logits = classify_features(model, features)
+        # Samples are independent, so one backward of the summed target
+        # logits yields every sample's own gradient
+        score = logits.gather(1, targets).sum()
+        grads, = torch.autograd.grad(score, features)
+
+    weights = grads.mean(dim=(2, 3), keepdim=True)
+    cams = F.relu((weights * features.detach()).sum(dim=1))
+    peak = cams.flatten(1).max(dim=1).values.clamp(min=1e-8)
+    return (cams / peak.view(-1, 1, 1)).cpu().numpy()
+
+def _colormap(values):
+    # Blue -> green -> yellow -> red ramp, vectorised over the whole map
+    r = np.clip(1.5 - np.abs(4 * values - 3), 0, 1)
+    g = np.clip(1.5 - np.abs(4 * values - 2), 0, 1)
+    b = np.clip(1.5 - np.abs(4 * values - 1), 0, 1)
+    return (np.stack([r, g, b], axis=-1) * 255).astype(np.uint8)
+
+def render_overlay(image_path, cam, output_path, alpha=0.45):
+    """
+    Tumpuk heatmap di atas gambar dan simpan sebagai JPEG
+    """
+    with Image.open(image_path) as image:
+        image = image.convert('RGB')
+
+    heat = Image.fromarray((cam * 255).astype(np.uint8)).resize(image.size, Image.BILINEAR)
+    colored = Image.fromarray(_colormap(np.asarray(heat, dtype=np.float32) / 255))
+    Image.blend(image, colored, alpha).save(output_path, 'JPEG', quality=85)
+    return output_path
@@ -0,0 +1,172 @@
+import json
+import queue
+import sqlite3
+import threading
+from contextlib import closing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    image_hash TEXT,
+    filename TEXT,
+    predicted_class TEXT NOT NULL,
+    confidence REAL,
+    top_3 TEXT,
+    is_likely_tomato INTEGER,
+    warning_message TEXT,
+    validation_reasons TEXT,
+    model_version TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_created_at ON predictions (created_at);
+CREATE INDEX IF NOT EXISTS idx_predictions_class_time ON predictions (predicted_class, created_at);
+CREATE INDEX IF NOT EXISTS idx_predictions_hash ON predictions (image_hash);
+"""
+
+INSERT = """
+INSERT INTO predictions (created_at, image_hash, filename, predicted_class, confidence, top_3,
+                         is_likely_tomato, warning_message, validation_reasons, model_version)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_STOP = object()
+
+
+class PredictionHistory:
+    """
+    Riwayat prediksi di SQLite. Request hanya memasukkan baris ke antrian;
+    thread writer menulisnya per batch dalam satu transaksi.
+    """
+
+    def __init__(self, db_path='predictions.db', batch_size=64, flush_interval=0.5, max_queue=10000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._writer = threading.Thread(target=self._write_loop, name='history-writer', daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def record(self, result):
+        """
+        Antrikan satu hasil prediksi tanpa menunggu disk
+        """
+        debug_info = result.get('debug_info', {})
+        row = (
+            result['timestamp'],
+            result.get('image_hash'),
+            result.get('filename'),
+            result['prediction'],
+            result['confidence'],
+            json.dumps(result['top_3']),
+            int(result['is_likely_tomato']),
+            result.get('warning_message'),
+            json.dumps(debug_info.get('validation_reasons', [])),
+            result.get('model_version'),
+        )
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            # History is best effort; never block a prediction on it
+            self.dropped += 1
+
+    def _write_loop(self):
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = []
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if batch:
+                try:
+                    with conn:
+                        conn.executemany(INSERT, batch)
+                except sqlite3.Error as e:
+                    print(f"Failed to write prediction history: {e}")
+                    self.dropped += len(batch)
+        conn.close()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._writer.join()
+
+    def query(self, limit=50, offset=0, predicted_class=None, since=None, until=None, image_hash=None):
+        clauses, params = [], []
+        if predicted_class:
+            clauses.append("predicted_class = ?")
+            params.append(predicted_class)
+        if since:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if image_hash:
+            clauses.append("image_hash = ?")
+            params.append(image_hash)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT * FROM predictions {where} ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?"
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(sql, params + [limit, offset]).fetchall()
+
+        records = []
+        for row in rows:
+            record = dict(row)
+            record['top_3'] = json.loads(record['top_3'] or '[]')
+            record['validation_reasons'] = json.loads(record['validation_reasons'] or '[]')
+            record['is_likely_tomato'] = bool(record['is_likely_tomato'])
+            records.append(record)
+        return records
+
+    def daily_class_counts(self, since=None, until=None):
+        """
+        Jumlah prediksi per kelas per hari
+        """
+        clauses, params = [], []
+        if since:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until:
+            clauses.append("created_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        sql = f"""
+            SELECT date(created_at) AS day,
+                   predicted_class,
+                   COUNT(*) AS count,
+                   AVG(confidence) AS avg_confidence,
+                   SUM(CASE WHEN is_likely_tomato = 0 THEN 1 ELSE 0 END) AS not_tomato
+            FROM predictions {where}
+            GROUP BY day, predicted_class
+            ORDER BY day, predicted_class
+        """
+        with closing(self._connect()) as conn:
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
@@ -0,0 +1,344 @@
+"""
+Load test untuk service Flask dengan memutar ulang folder gambar.
+
+Menjalankan server lokal (atau memakai --url), mengirim upload ke "/" dan
+download laporan ke "/download_report/<filename>" dengan rate tetap
+(--rate) atau concurrency tetap (--concurrency), lalu menulis ringkasan
+throughput, latensi, error/reject rate dan CPU/RSS server dalam JSON.
+
+Contoh:
+    python loadtest.py --concurrency 4 --duration 60 --report-ratio 0.2
+    python loadtest.py --rate 10 --duration 120 --output summary.json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Same extensions app.allowed_file accepts
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+# Status codes that mean the server shed load rather than failed
+REJECT_STATUSES = {413, 429, 503}
+
+
+def list_images(folder):
+    return sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if '.' in name and name.rsplit('.', 1)[1].lower() in IMAGE_EXTENSIONS
+    )
+
+def encode_multipart(field, filename, data):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+class ProcessSampler:
+    """
+    Sampling CPU dan RSS sebuah process dari /proc (Linux)
+    """
+
+    def __init__(self, pid, interval=1.0):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._ticks = os.sysconf('SC_CLK_TCK')
+
+    def _read(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            # Skip past the command name, which may contain spaces
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / self._ticks
+        rss_mb = None
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss_mb = int(line.split()[1]) / 1024
+        return cpu_seconds, rss_mb
+
+    def _run(self):
+        start = time.perf_counter()
+        last_cpu, _ = self._read()
+        last_time = start
+        while not self._stop.wait(self.interval):
+            try:
+                cpu, rss_mb = self._read()
+            except (OSError, IndexError):
+                return
+            now = time.perf_counter()
+            self.samples.append({
+                't': round(now - start, 3),
+                'cpu_percent': 100 * (cpu - last_cpu) / (now - last_time),
+                'rss_mb': rss_mb,
+            })
+            last_cpu, last_time = cpu, now
+
+    def start(self):
+        if os.path.exists(f"/proc/{self.pid}/stat"):
+            self._thread.start()
+        else:
+            print("Process sampling needs /proc; skipping CPU/RSS collection")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+class LoadTest:
+    def __init__(self, base_url, images, report_ratio=0.0, timeout=60.0, bust_cache=False):
+        self.base_url = base_url.rstrip('/')
+        self.images = images
+        self.report_ratio = report_ratio
+        self.bust_cache = bust_cache
+        self.timeout = timeout
+        self.results = []
+        self.uploaded = []
+        self._lock = threading.Lock()
+        self._image_cache = {}
+
+    def _image_bytes(self, path):
+        data = self._image_cache.get(path)
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+            self._image_cache[path] = data
+        return data
+
+    def _choose_kind(self):
+        # report_ratio is report downloads per upload
+        with self._lock:
+            have_uploads = bool(self.uploaded)
+        if have_uploads and random.random() < self.report_ratio / (1 + self.report_ratio):
+            return 'report'
+        return 'upload'
+
+    def _request(self, kind):
+        if kind == 'upload':
+            path = random.choice(self.images)
+            data = self._image_bytes(path)
+            if self.bust_cache:
+                # Trailing bytes change the file hash but decoders ignore them
+                data += os.urandom(16)
+            body, content_type = encode_multipart('image', os.path.basename(path), data)
+            req = urllib.request.Request(self.base_url + '/', data=body, method='POST',
+                                         headers={'Content-Type': content_type})
+        else:
+            with self._lock:
+                filename = random.choice(self.uploaded)
+            req = urllib.request.Request(f"{self.base_url}/download_report/{urllib.parse.quote(filename)}")
+
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                status = response.status
+                payload = response.read()
+        except urllib.error.HTTPError as e:
+            return 'reject' if e.code in REJECT_STATUSES else 'error', e.code
+        except Exception:
+            return 'error', None
+
+        if kind == 'upload':
+            try:
+                data = json.loads(payload)
+            except ValueError:
+                return 'error', status
+            if 'error' in data:
+                return 'error', status
+            with self._lock:
+                self.uploaded.append(data['filename'])
+        return 'ok', status
+
+    def _timed(self, kind, scheduled):
+        outcome, status = self._request(kind)
+        # Latency counts from the scheduled send time so queueing in the
+        # client under overload is not hidden (coordinated omission)
+        latency = time.perf_counter() - scheduled
+        with self._lock:
+            self.results.append({
+                'kind': kind,
+                'outcome': outcome,
+                'status': status,
+                'latency_ms': latency * 1000,
+            })
+
+    def run_concurrency(self, concurrency, duration):
+        deadline = time.perf_counter() + duration
+
+        def worker():
+            while time.perf_counter() < deadline:
+                self._timed(self._choose_kind(), time.perf_counter())
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def run_rate(self, rate, duration, max_inflight=256):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_inflight) as pool:
+            i = 0
+            while True:
+                scheduled = start + i / rate
+                if scheduled - start >= duration:
+                    break
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self._timed, self._choose_kind(), scheduled)
+                i += 1
+
+
+def summarize(results, wall_seconds):
+    def stats(rows):
+        if not rows:
+            return {'requests': 0}
+        ok_latencies = np.array([r['latency_ms'] for r in rows if r['outcome'] == 'ok'])
+        summary = {
+            'requests': len(rows),
+            'ok': int(sum(r['outcome'] == 'ok' for r in rows)),
+            'throughput_rps': sum(r['outcome'] == 'ok' for r in rows) / wall_seconds,
+            'error_rate': sum(r['outcome'] == 'error' for r in rows) / len(rows),
+            'reject_rate': sum(r['outcome'] == 'reject' for r in rows) / len(rows),
+        }
+        if len(ok_latencies):
+            summary.update({
+                'p50_ms': float(np.percentile(ok_latencies, 50)),
+                'p95_ms': float(np.percentile(ok_latencies, 95)),
+                'p99_ms': float(np.percentile(ok_latencies, 99)),
+                'max_ms': float(ok_latencies.max()),
+            })
+        return summary
+
+    return {
+        'overall': stats(results),
+        'upload': stats([r for r in results if r['kind'] == 'upload']),
+        'report': stats([r for r in results if r['kind'] == 'report']),
+    }
+
+def start_server(port, workdir):
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    # FLASK_APP rather than --app, which needs Flask 2.2+
+    env = dict(os.environ,
+               FLASK_APP='app',
+               UPLOAD_FOLDER=os.path.join(workdir, 'uploads'),
+               HISTORY_DB=os.path.join(workdir, 'predictions.db'))
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'flask', 'run',
+         '--port', str(port), '--no-reload', '--no-debugger', '--with-threads'],
+        cwd=app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(120):
+        if proc.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            with urllib.request.urlopen(url + '/', timeout=1):
+                return proc, url
+        except OSError:
+            time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError("Server did not become ready in time")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay load test for the tomato disease service")
+    parser.add_argument('--images', default='static/uploads', help="Folder of images to replay")
+    parser.add_argument('--url', help="Target an already running server instead of starting one")
+    parser.add_argument('--server-pid', type=int, help="PID to sample CPU/RSS from when using --url")
+    parser.add_argument('--port', type=int, default=5055)
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--rate', type=float, help="Fixed arrival rate in requests per second")
+    mode.add_argument('--concurrency', type=int, help="Fixed number of concurrent clients")
+    parser.add_argument('--duration', type=float, default=30.0, help="Test length in seconds")
+    parser.add_argument('--report-ratio', type=float, default=0.0, help="Report downloads per upload")
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--bust-cache', action='store_true',
+                        help="Make every upload unique so the server's prediction cache never hits")
+    parser.add_argument('--sample-interval', type=float, default=1.0)
+    parser.add_argument('--output', help="Write the JSON summary here as well as stdout")
+    args = parser.parse_args()
+
+    images = list_images(args.images)
+    if not images:
+        parser.error(f"No images found in {args.images}")
+
+    workdir = None
+    proc = None
+    if args.url:
+        url, pid = args.url, args.server_pid
+    else:
+        # Keep the test's uploads, reports and history out of the real folders
+        workdir = tempfile.mkdtemp(prefix='tomato-loadtest-')
+        proc, url = start_server(args.port, workdir)
+        pid = proc.pid
+
+    sampler = ProcessSampler(pid, args.sample_interval) if pid else None
+    test = LoadTest(url, images, report_ratio=args.report_ratio, timeout=args.timeout,
+                    bust_cache=args.bust_cache)
+
+    try:
+        if sampler:
+            sampler.start()
+        start = time.perf_counter()
+        if args.rate:
+            test.run_rate(args.rate, args.duration)
+        else:
+            test.run_concurrency(args.concurrency, args.duration)
+        wall_seconds = time.perf_counter() - start
+    finally:
+        if sampler:
+            sampler.stop()
+        if proc:
+            proc.terminate()
+            proc.wait()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    summary = {
+        'config': {
+            'url': url,
+            'images': len(images),
+            'mode': 'rate' if args.rate else 'concurrency',
+            'rate': args.rate,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'report_ratio': args.report_ratio,
+            'bust_cache': args.bust_cache,
+        },
+        'wall_seconds': wall_seconds,
+        'results': summarize(test.results, wall_seconds),
+        'server': {
+            'samples': sampler.samples if sampler else [],
+            'peak_rss_mb': max((s['rss_mb'] or 0 for s in sampler.samples), default=None) if sampler else None,
+            'mean_cpu_percent': float(np.mean([s['cpu_percent'] for s in sampler.samples])) if sampler and sampler.samples else None,
+        },
+    }
+
+    text = json.dumps(summary, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import os
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from predict import load_model, predict_image
+
+ACTIVE_FILE = 'ACTIVE'
+FALLBACK_VERSION = 'best_model'
+
+
+class ModelRegistry:
+    """
+    Registry model berversi: setiap checkpoint <version>.pth di satu direktori,
+    model aktif bisa diganti tanpa restart dan kandidat bisa dijalankan
+    sebagai shadow pada sebagian trafik.
+    """
+
+    def __init__(self, root='model_registry', fallback_path='best_model.pth', max_shadow_pending=8):
+        self.root = root
+        self.fallback_path = fallback_path
+        self.max_shadow_pending = max_shadow_pending
+        os.makedirs(root, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._active = None
+        self._shadow = None
+        self._shadow_pending = 0
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow')
+        self._reset_shadow_stats()
+
+    def versions(self):
+        return sorted(name[:-4] for name in os.listdir(self.root) if name.endswith('.pth'))
+
+    def newest_version(self):
+        # By file time, since names such as v9 and v10 do not sort by age
+        versions = self.versions()
+        if not versions:
+            return None
+        return max(versions, key=lambda version: os.path.getmtime(self.checkpoint_path(version)))
+
+    def checkpoint_path(self, version):
+        if version == FALLBACK_VERSION and version not in self.versions():
+            return self.fallback_path
+        return os.path.join(self.root, f"{version}.pth")
+
+    def _load(self, version):
+        if version != FALLBACK_VERSION and version not in self.versions():
+            raise KeyError(version)
+        return load_model(self.checkpoint_path(version))
+
+    def load_active(self):
+        """
+        Muat model aktif: versi di file ACTIVE, versi terbaru, atau best_model.pth
+        """
+        versions = self.versions()
+        version = None
+        try:
+            with open(os.path.join(self.root, ACTIVE_FILE)) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            pass
+
+        if version not in versions and version != FALLBACK_VERSION:
+            version = self.newest_version() or FALLBACK_VERSION
+
+        model = self._load(version)
+        with self._lock:
+            self._active = (version, model)
+        print(f"Active model version: {version}")
+        return version
+
+    def get(self):
+        """
+        Kembalikan (version, model) aktif; request memegang referensi ini
+        sampai selesai sehingga swap tidak mengganggu request yang sedang jalan
+        """
+        return self._active
+
+    def activate(self, version):
+        # Load outside the lock so predictions keep flowing meanwhile
+        model = self._load(version)
+        with self._lock:
+            previous = self._active[0] if self._active else None
+            self._active = (version, model)
+
+        # Persist the choice atomically so a restart keeps the same version
+        tmp_path = os.path.join(self.root, ACTIVE_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(self.root, ACTIVE_FILE))
+
+        print(f"Activated model version {version} (was {previous})")
+        return previous
+
+    def _reset_shadow_stats(self):
+        self._shadow_stats = {
+            'sampled': 0,
+            'agreed': 0,
+            'skipped_busy': 0,
+            'errors': 0,
+            'recent_disagreements': deque(maxlen=50),
+        }
+
+    def set_shadow(self, version, sample_rate):
+        model = self._load(version)
+        with self._lock:
+            self._shadow = (version, model, float(sample_rate))
+            self._reset_shadow_stats()
+
+    def clear_shadow(self):
+        with self._lock:
+            self._shadow = None
+
+    def maybe_shadow(self, image_path, live_result):
+        """
+        Jalankan model kandidat di background untuk sebagian request
+        """
+        shadow = self._shadow
+        if shadow is None or random.random() >= shadow[2]:
+            return
+
+        with self._lock:
+            if self._shadow_pending >= self.max_shadow_pending:
+                # Never let shadow work queue up behind live traffic
+                self._shadow_stats['skipped_busy'] += 1
+                return
+            self._shadow_pending += 1
+
+        self._shadow_executor.submit(self._run_shadow, shadow, image_path, live_result)
+
+    def _run_shadow(self, shadow, image_path, live_result):
+        version, model, _ = shadow
+        try:
+            # Candidate runs stay out of the live TTA statistics and profiling samples
+            shadow_result = predict_image(image_path, model, tta_source=None, profile=False)
+        except Exception as e:
+            print(f"Shadow inference failed: {e}")
+            with self._lock:
+                self._shadow_pending -= 1
+                self._shadow_stats['errors'] += 1
+            return
+
+        agreed = shadow_result['prediction'] == live_result['prediction']
+        with self._lock:
+            self._shadow_pending -= 1
+            # Ignore results from a shadow that was replaced meanwhile
+            if self._shadow is None or self._shadow[0] != version:
+                return
+            stats = self._shadow_stats
+            stats['sampled'] += 1
+            if agreed:
+                stats['agreed'] += 1
+            else:
+                stats['recent_disagreements'].append({
+                    'image_path': image_path,
+                    'live': live_result['prediction'],
+                    'live_confidence': live_result['confidence'],
+                    'shadow': shadow_result['prediction'],
+                    'shadow_confidence': shadow_result['confidence'],
+                    'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                })
+
+    def status(self):
+        with self._lock:
+            shadow = self._shadow
+            stats = dict(self._shadow_stats)
+            stats['recent_disagreements'] = list(stats['recent_disagreements'])
+            pending = self._shadow_pending
+
+        shadow_info = None
+        if shadow is not None:
+            stats['agreement_rate'] = stats['agreed'] / stats['sampled'] if stats['sampled'] else None
+            stats['pending'] = pending
+            shadow_info = {'version': shadow[0], 'sample_rate': shadow[2], 'stats': stats}
+
+        return {
+            'active': self._active[0] if self._active else None,
+            'versions': self.versions(),
+            'shadow': shadow_info,
+        }
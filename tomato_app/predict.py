@@ -1,12 +1,23 @@
+import os
+import json
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.profiler import record_function
 from torchvision import models, transforms
+from torchvision.models.mobilenetv3 import MobileNetV3, _mobilenet_v3_conf
 from PIL import Image, ImageStat, ImageFilter
 import numpy as np
 
+from profiling import profiler
+from severity import estimate_lesion_area, adjust_severity
+from tta import tta
+
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+# Threading configuration written by autotune.py
+RUNTIME_CONFIG_PATH = os.environ.get('TOMATO_RUNTIME_CONFIG', 'runtime_config.json')
+
 class_names = [
     'Tomato___Bacterial_spot',
     'Tomato___Early_blight',
@@ -437,16 +448,79 @@ disease_info = {
     }
 }
 
+transform = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize([0.485, 0.456, 0.406],
+                         [0.229, 0.224, 0.225])
+])
+
+def load_runtime_config(path=RUNTIME_CONFIG_PATH):
+    """
+    Baca konfigurasi runtime hasil autotune, kosong jika belum ada
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Could not read runtime config {path}: {e}")
+        return {}
+
+def apply_runtime_config(config):
+    """
+    Terapkan jumlah thread intra-op dan inter-op ke PyTorch
+    """
+    intra_op_threads = config.get('intra_op_threads')
+    inter_op_threads = config.get('inter_op_threads')
+
+    if intra_op_threads:
+        torch.set_num_threads(int(intra_op_threads))
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(int(inter_op_threads))
+        except RuntimeError as e:
+            # Can only be set once, before any inter-op work has started
+            print(f"Could not set inter-op threads: {e}")
+
+    if intra_op_threads or inter_op_threads:
+        print(f"Runtime threads: intra-op={torch.get_num_threads()}, inter-op={torch.get_num_interop_threads()}")
+
+def build_model(arch=None):
+    """
+    Bangun MobileNetV3-Large; arch dari checkpoint hasil pruning (compress.py)
+    menentukan channel ekspansi tiap blok dan hidden layer classifier
+    """
+    if not arch:
+        model = models.mobilenet_v3_large(weights=None)
+        model.classifier[3] = nn.Linear(model.classifier[3].in_features, len(class_names))
+        return model
+
+    setting, _ = _mobilenet_v3_conf('mobilenet_v3_large')
+    for cnf, expanded_channels in zip(setting, arch['expanded_channels']):
+        cnf.expanded_channels = expanded_channels
+    return MobileNetV3(setting, arch['last_channel'], num_classes=len(class_names))
+
 def load_model(path='best_model.pth'):
-    model = models.mobilenet_v3_large(weights=None)
-    model.classifier[3] = nn.Linear(model.classifier[3].in_features, len(class_names))
-    
+    checkpoint = None
     try:
-        model.load_state_dict(torch.load(path, map_location=device))
-        print(f"Loaded model from {path}")
+        checkpoint = torch.load(path, map_location=device)
     except FileNotFoundError:
         print(f"Model file {path} not found. Using randomly initialized model for demo purposes.")
         print("Note: Predictions will be random until you train and save a proper model.")
+
+    # Pruned checkpoints wrap the weights together with their architecture
+    if isinstance(checkpoint, dict) and 'arch' in checkpoint:
+        model = build_model(checkpoint['arch'])
+        model.load_state_dict(checkpoint['state_dict'])
+    else:
+        model = build_model()
+        if checkpoint is not None:
+            model.load_state_dict(checkpoint)
+
+    if checkpoint is not None:
+        print(f"Loaded model from {path}")
     
     model.eval()
     model.to(device)
@@ -485,27 +559,53 @@ def detect_non_tomato_features(image_path):
         print(f"Error in detection: {e}")
         return 0, []
 
-def predict_image(image_path, model):
-    transform = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize([0.485, 0.456, 0.406],
-                             [0.229, 0.224, 0.225])
-    ])
-    
+def classify_features(model, features):
+    """
+    Bagian kepala MobileNetV3 (pooling + classifier) dari aktivasi fitur
+    """
+    return model.classifier(torch.flatten(model.avgpool(features), 1))
+
+def predict_batch(images, model, tta_source=None):
+    """
+    Prediksi banyak gambar PIL dalam satu forward pass, kembalikan probabilitas;
+    tta_source memberi label statistik TTA
+    """
+    batch = torch.stack([transform(image.convert("RGB")) for image in images]).to(device)
+    with torch.no_grad():
+        probabilities = F.softmax(model(batch), dim=1)
+    # Uncertain rows of the whole batch share one extra forward pass
+    probabilities, _ = tta.refine(model, batch, probabilities, source=tta_source)
+    return probabilities.cpu().numpy()
+
+@profiler.profiled('predict_image')
+def predict_image(image_path, model, return_activations=False, tta_source='image'):
     # Pre-analysis for non-tomato detection
-    non_tomato_score, non_tomato_reasons = detect_non_tomato_features(image_path)
+    with record_function("detect_non_tomato_features"):
+        non_tomato_score, non_tomato_reasons = detect_non_tomato_features(image_path)
+    
+    with record_function("decode_and_transform"):
+        pil_image = Image.open(image_path).convert("RGB")
+        image = transform(pil_image).unsqueeze(0).to(device)
     
-    image = Image.open(image_path).convert("RGB")
-    image = transform(image).unsqueeze(0).to(device)
+    # Lesion-area estimate from the already decoded image
+    with record_function("severity_estimate"):
+        severity_estimate = estimate_lesion_area(pil_image)
 
-    with torch.no_grad():
-        outputs = model(image)
+    with torch.no_grad(), record_function("model_forward"):
+        # Same as model(image), but keeps the last feature map for Grad-CAM
+        activations = model.features(image)
+        outputs = classify_features(model, activations)
         probabilities = F.softmax(outputs, dim=1)
-        confidence, preds = torch.max(probabilities, 1)
+
+    with record_function("test_time_augmentation"):
+        probabilities, tta_info = tta.refine(model, image, probabilities, source=tta_source)
+    confidence, preds = torch.max(probabilities, 1)
 
     predicted_class = class_names[preds.item()]
     confidence_score = float(confidence.item()) * 100
+    tta_info = tta_info[0]
+    if tta_info:
+        tta_info['single_view_prediction'] = class_names[tta_info.pop('single_view_index')]
     
     # Get all probabilities for top predictions
     probs = probabilities[0].cpu().numpy()
@@ -558,14 +658,18 @@ def predict_image(image_path, model):
     
     # Get disease information
     disease_data = disease_info.get(predicted_class, {})
+    severity_estimate['adjusted_severity'] = adjust_severity(
+        disease_data.get('severity'), severity_estimate['lesion_area_percent'])
     
     result = {
         'prediction': predicted_class,
         'confidence': confidence_score,
         'top_3': top_3_predictions,
         'disease_info': disease_data,
+        'severity_estimate': severity_estimate,
         'is_likely_tomato': is_likely_tomato,
         'warning_message': warning_message,
+        'tta': tta_info,
         'debug_info': {
             'non_tomato_score': non_tomato_score,
             'entropy': float(entropy),
@@ -574,4 +678,6 @@ def predict_image(image_path, model):
         }
     }
     
+    if return_activations:
+        return result, activations
     return result
@@ -0,0 +1,42 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """
+    SHA-256 isi file, dipakai sebagai kunci cache prediksi
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    Cache LRU hasil prediksi dengan kunci (hash gambar, versi model)
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, image_hash, model_version):
+        key = (image_hash, model_version)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+        # Callers annotate results per request, so hand out a copy
+        return dict(result) if result is not None else None
+
+    def put(self, image_hash, model_version, result):
+        key = (image_hash, model_version)
+        with self._lock:
+            self._entries[key] = dict(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
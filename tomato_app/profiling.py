@@ -0,0 +1,167 @@
+import os
+import sys
+import json
+import time
+import threading
+import itertools
+import tracemalloc
+import functools
+from collections import Counter, deque
+from datetime import datetime
+
+import torch
+from torch.profiler import profile, ProfilerActivity
+
+
+class StackSampler:
+    """
+    Sampler sederhana: ambil stack Python satu thread secara periodik
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def write_collapsed(self, path):
+        # Collapsed-stack format, readable by flamegraph.pl and speedscope
+        with open(path, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class RequestProfiler:
+    """
+    Profiling per request yang disampling setiap N panggilan. Saat every_n
+    bernilai 0 wrapper langsung memanggil fungsi aslinya.
+    """
+
+    def __init__(self, every_n=0, output_dir='profiles', top_allocations=25):
+        self.every_n = every_n
+        self.output_dir = output_dir
+        self.top_allocations = top_allocations
+        self.captured = deque(maxlen=100)
+        self._counters = {}
+        # tracemalloc and the torch profiler are process-wide, so only one
+        # request is profiled at a time
+        self._busy = threading.Lock()
+
+    def configure(self, every_n=None, output_dir=None):
+        if output_dir is not None:
+            self.output_dir = output_dir
+        if every_n is not None:
+            self._counters = {}
+            self.every_n = int(every_n)
+
+    def status(self):
+        return {
+            'every_n': self.every_n,
+            'output_dir': self.output_dir,
+            'captured': list(self.captured)[-20:],
+        }
+
+    def profiled(self, name):
+        """
+        Decorator; pemanggil di luar request (shadow, Grad-CAM) mengirim
+        profile=False agar tidak ikut dihitung maupun diprofil
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, profile=True, **kwargs):
+                if not self.every_n or not profile:
+                    return func(*args, **kwargs)
+
+                counter = self._counters.setdefault(name, itertools.count())
+                if next(counter) % self.every_n or not self._busy.acquire(blocking=False):
+                    return func(*args, **kwargs)
+                try:
+                    return self._run_profiled(name, func, args, kwargs)
+                finally:
+                    self._busy.release()
+            return wrapper
+        return decorator
+
+    def _run_profiled(self, name, func, args, kwargs):
+        os.makedirs(self.output_dir, exist_ok=True)
+        trace_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{name}"
+        base_path = os.path.join(self.output_dir, trace_id)
+
+        tracemalloc.start()
+        try:
+            start = time.perf_counter()
+            with StackSampler(threading.get_ident()) as sampler:
+                with profile(activities=[ProfilerActivity.CPU], record_shapes=True) as prof:
+                    result = func(*args, **kwargs)
+            wall_ms = (time.perf_counter() - start) * 1000
+            # Leave out the sampler's own bookkeeping and lazy imports
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+            ])
+            _, peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            # A failing call must not leave tracing on for every later request
+            tracemalloc.stop()
+
+        prof.export_chrome_trace(base_path + '.trace.json')
+        sampler.write_collapsed(base_path + '.stacks.txt')
+
+        allocations = [
+            {
+                'location': str(stat.traceback[0]),
+                'size_bytes': stat.size,
+                'count': stat.count,
+            }
+            for stat in snapshot.statistics('lineno')[:self.top_allocations]
+        ]
+        top_ops = [
+            {
+                'name': event.key,
+                'calls': event.count,
+                'self_cpu_ms': event.self_cpu_time_total / 1000,
+                'cpu_ms': event.cpu_time_total / 1000,
+            }
+            for event in sorted(prof.key_averages(), key=lambda e: e.self_cpu_time_total, reverse=True)[:20]
+        ]
+        summary = {
+            'name': name,
+            'wall_ms': wall_ms,
+            'python_peak_bytes': peak_bytes,
+            'python_samples': sum(sampler.samples.values()),
+            'top_allocations': allocations,
+            'top_torch_ops': top_ops,
+            'torch_threads': torch.get_num_threads(),
+        }
+        with open(base_path + '.summary.json', 'w') as f:
+            json.dump(summary, f, indent=2)
+
+        self.captured.append(trace_id)
+        print(f"Profiled {name} in {wall_ms:.1f} ms -> {base_path}.*")
+        return result
+
+
+profiler = RequestProfiler(
+    every_n=int(os.environ.get('PROFILE_EVERY_N', 0)),
+    output_dir=os.environ.get('PROFILE_DIR', 'profiles'),
+)
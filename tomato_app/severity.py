@@ -0,0 +1,106 @@
+import time
+
+import numpy as np
+from PIL import Image
+
+ANALYSIS_SIZE = 256
+# Lesion-area thresholds (percent of leaf area) for the per-image level
+LESION_LEVELS = [(5, 'Ringan'), (15, 'Sedang'), (35, 'Berat'), (100.1, 'Sangat Berat')]
+# Class severities from disease_info, mildest first
+CLASS_SEVERITIES = ['Tidak ada', 'Sedang', 'Tinggi', 'Sangat Tinggi']
+
+
+def _rgb_to_hsv(rgb):
+    # Vectorised HSV on planar channels; hue in degrees, S and V in [0, 1]
+    r, g, b = np.moveaxis(rgb, -1, 0)
+    maxc = np.maximum(np.maximum(r, g), b)
+    minc = np.minimum(np.minimum(r, g), b)
+    delta = maxc - minc
+    inv_delta = 1 / np.maximum(delta, 1e-6)
+
+    hue = np.where(maxc == r, (g - b) * inv_delta,
+                   np.where(maxc == g, (b - r) * inv_delta + 2, (r - g) * inv_delta + 4))
+    hue = (hue * 60) % 360
+    saturation = delta / np.maximum(maxc, 1e-6)
+    return hue, saturation, maxc
+
+def _box_mean(mask, radius):
+    # Neighbourhood mean via an integral image, no Python loops
+    padded = np.pad(mask.astype(np.float32), radius + 1, mode='edge')
+    integral = padded.cumsum(axis=0).cumsum(axis=1)
+    k = 2 * radius + 1
+    total = (integral[k:, k:] - integral[:-k, k:] - integral[k:, :-k] + integral[:-k, :-k])
+    return total[:mask.shape[0], :mask.shape[1]] / (k * k)
+
+def _enclosed(mask, min_sides=3):
+    # Hole fill without a flood fill: a pixel is inside the leaf when leaf
+    # tissue lies on at least min_sides of its left/right/up/down rays
+    sides = (
+        np.maximum.accumulate(mask, axis=1).astype(np.uint8)
+        + np.maximum.accumulate(mask[:, ::-1], axis=1)[:, ::-1]
+        + np.maximum.accumulate(mask, axis=0)
+        + np.maximum.accumulate(mask[::-1], axis=0)[::-1]
+    )
+    return sides >= min_sides
+
+def _analysis_image(image):
+    if isinstance(image, Image.Image):
+        # Already decoded (predict_image): shrink with a cheap integer reduce
+        factor = max(1, min(image.size) // ANALYSIS_SIZE)
+        # Work on a copy; thumbnail() below resizes in place
+        image = image.reduce(factor) if factor > 1 else image.copy()
+    else:
+        with Image.open(image) as opened:
+            # JPEG decodes straight to a fraction of the size
+            opened.draft('RGB', (ANALYSIS_SIZE, ANALYSIS_SIZE))
+            image = opened.convert('RGB')
+    image.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE), Image.BILINEAR)
+    return image
+
+def estimate_lesion_area(image):
+    """
+    Estimasi persentase area lesi terhadap area daun pada gambar resolusi
+    rendah; image berupa path atau PIL Image RGB yang sudah didecode
+    """
+    start = time.perf_counter()
+    rgb = np.asarray(_analysis_image(image), dtype=np.float32) / 255
+    hue, saturation, value = _rgb_to_hsv(rgb)
+
+    healthy = (hue >= 50) & (hue <= 170) & (saturation > 0.12) & (value > 0.1)
+    # Yellow/brown discolouration and dark brown necrotic tissue; dark
+    # green shadows inside the leaf are not lesions
+    discoloured = (hue < 50) & (saturation > 0.25) & (value > 0.2)
+    necrotic = (hue < 50) & (saturation > 0.2) & (value <= 0.3)
+
+    # Only count candidate lesions inside the leaf outline or bordering leaf
+    # tissue (lesions on the leaf margin), so soil or a brown background is
+    # not mistaken for disease while large patches still count in full
+    near_leaf = _box_mean(healthy, radius=ANALYSIS_SIZE // 32) > 0.15
+    lesion = (discoloured | necrotic) & (near_leaf | _enclosed(healthy))
+    leaf = healthy | lesion
+
+    leaf_pixels = int(leaf.sum())
+    lesion_percent = 100.0 * lesion.sum() / leaf_pixels if leaf_pixels else 0.0
+    level = next(name for limit, name in LESION_LEVELS if lesion_percent < limit)
+
+    return {
+        'lesion_area_percent': float(lesion_percent),
+        'leaf_area_percent': 100.0 * leaf_pixels / leaf.size,
+        'level': level,
+        'elapsed_ms': (time.perf_counter() - start) * 1000,
+    }
+
+def adjust_severity(class_severity, lesion_percent):
+    """
+    Sesuaikan tingkat keparahan kelas dengan luas lesi pada gambar
+    """
+    if class_severity not in CLASS_SEVERITIES or class_severity == 'Tidak ada' or lesion_percent is None:
+        return class_severity
+
+    index = CLASS_SEVERITIES.index(class_severity)
+    if lesion_percent >= 15:
+        index = min(index + 1, len(CLASS_SEVERITIES) - 1)
+    elif lesion_percent < 5:
+        # A few spots of a serious disease still need treatment
+        index = max(index - 1, 1)
+    return CLASS_SEVERITIES[index]
@@ -0,0 +1,166 @@
+import os
+import time
+import threading
+from collections import deque
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+
+def _zoom(batch, scale=0.875):
+    # Centre crop, resized back to the input size
+    size = batch.shape[-1]
+    crop = int(round(size * scale))
+    offset = (size - crop) // 2
+    cropped = batch[..., offset:offset + crop, offset:offset + crop]
+    return F.interpolate(cropped, size=(size, size), mode='bilinear', align_corners=False)
+
+def _shrink(batch, scale=0.875):
+    # Whole leaf at a smaller scale, reflect-padded back to the input size
+    size = batch.shape[-1]
+    small = F.interpolate(batch, scale_factor=scale, mode='bilinear', align_corners=False)
+    pad = size - small.shape[-1]
+    return F.pad(small, (pad // 2, pad - pad // 2, pad // 2, pad - pad // 2), mode='reflect')
+
+# Extra views on top of the original; they work on the already normalised
+# N x 3 x 224 x 224 tensor, so nothing is decoded twice
+TTA_VIEWS = {
+    'hflip': lambda batch: batch.flip(-1),
+    'vflip': lambda batch: batch.flip(-2),
+    'zoom': _zoom,
+    'shrink': _shrink,
+    'hflip_zoom': lambda batch: _zoom(batch.flip(-1)),
+}
+
+
+class TestTimeAugmentation:
+    """
+    TTA hanya untuk prediksi yang ragu: semua view tambahan dari semua
+    gambar dijalankan dalam satu forward pass lalu probabilitasnya dirata-rata
+    """
+
+    def __init__(self, enabled=True, confidence_band=(20, 40), entropy_band=(1.9, 2.2)):
+        self.enabled = enabled
+        self.confidence_band = confidence_band
+        self.entropy_band = entropy_band
+        self._lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        # Counters per source ('image', 'video', ...); calls without a
+        # source, such as shadow-model inference, are not counted
+        self._stats = {}
+
+    def _source_stats(self, source):
+        return self._stats.setdefault(source, {
+            'predictions': 0,
+            'runs': 0,
+            'top1_changes': 0,
+            'added_ms': deque(maxlen=1000),
+        })
+
+    def configure(self, enabled=None, confidence_band=None, entropy_band=None):
+        with self._lock:
+            if enabled is not None:
+                self.enabled = bool(enabled)
+            if confidence_band is not None:
+                self.confidence_band = tuple(float(v) for v in confidence_band)
+            if entropy_band is not None:
+                self.entropy_band = tuple(float(v) for v in entropy_band)
+            self._reset_stats()
+
+    def uncertain(self, confidence, entropy):
+        """
+        confidence dalam persen, entropy dalam nat
+        """
+        low, high = self.confidence_band
+        entropy_low, entropy_high = self.entropy_band
+        return low <= confidence < high or entropy_low < entropy <= entropy_high
+
+    def refine(self, model, batch, probabilities, source=None):
+        """
+        Jalankan TTA untuk baris batch yang berada di band ragu.
+        probabilities: tensor N x K dari view asli; kembalikan tensor N x K
+        baru dan info TTA per gambar (None bila tidak dijalankan).
+        Statistik hanya dicatat bila source diisi.
+        """
+        count = len(probabilities)
+        if source:
+            with self._lock:
+                self._source_stats(source)['predictions'] += count
+        info = [None] * count
+        if not self.enabled:
+            return probabilities, info
+
+        confidence = probabilities.max(dim=1).values * 100
+        entropy = -(probabilities * torch.log(probabilities + 1e-10)).sum(dim=1)
+        rows = [i for i in range(count) if self.uncertain(float(confidence[i]), float(entropy[i]))]
+        if not rows:
+            return probabilities, info
+
+        start = time.perf_counter()
+        selected = batch[rows]
+        views = torch.cat([view(selected) for view in TTA_VIEWS.values()])
+        with torch.no_grad():
+            view_probs = F.softmax(model(views), dim=1)
+        # (views, rows, classes), averaged together with the original view
+        view_probs = view_probs.view(len(TTA_VIEWS), len(rows), -1)
+        averaged = (view_probs.sum(dim=0) + probabilities[rows]) / (len(TTA_VIEWS) + 1)
+        added_ms = (time.perf_counter() - start) * 1000
+
+        refined = probabilities.clone()
+        refined[rows] = averaged
+        changes = 0
+        for row, new_probs in zip(rows, averaged):
+            before = int(probabilities[row].argmax())
+            after = int(new_probs.argmax())
+            changes += before != after
+            info[row] = {
+                'views': len(TTA_VIEWS) + 1,
+                'single_view_index': before,
+                'single_view_confidence': float(confidence[row]),
+                'changed_top1': before != after,
+                # The whole stacked pass is shared by the rows in it
+                'added_ms': added_ms / len(rows),
+            }
+
+        if source:
+            with self._lock:
+                stats = self._source_stats(source)
+                stats['runs'] += len(rows)
+                stats['top1_changes'] += changes
+                stats['added_ms'].extend([added_ms / len(rows)] * len(rows))
+        return refined, info
+
+    def status(self):
+        def summarize(stats):
+            added = np.array(stats['added_ms']) if stats['added_ms'] else None
+            return {
+                'predictions': stats['predictions'],
+                'tta_runs': stats['runs'],
+                'tta_rate': stats['runs'] / stats['predictions'] if stats['predictions'] else 0.0,
+                'top1_changes': stats['top1_changes'],
+                'top1_change_rate': stats['top1_changes'] / stats['runs'] if stats['runs'] else 0.0,
+                'added_ms_mean': float(added.mean()) if added is not None else None,
+                'added_ms_p95': float(np.percentile(added, 95)) if added is not None else None,
+            }
+
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'views': ['original'] + list(TTA_VIEWS),
+                'confidence_band': list(self.confidence_band),
+                'entropy_band': list(self.entropy_band),
+                'sources': {source: summarize(stats) for source, stats in self._stats.items()},
+            }
+
+
+def _band(value, default):
+    return tuple(float(v) for v in value.split(',')) if value else default
+
+tta = TestTimeAugmentation(
+    enabled=os.environ.get('TTA_ENABLED', '1') != '0',
+    confidence_band=_band(os.environ.get('TTA_CONFIDENCE_BAND'), (20, 40)),
+    entropy_band=_band(os.environ.get('TTA_ENTROPY_BAND'), (1.9, 2.2)),
+)
@@ -0,0 +1,249 @@
+"""
+Analisis video dan rangkaian gambar dengan sampling frame dan deteksi
+perubahan.
+
+Frame didecode satu per satu (streaming), frame yang hampir sama dengan
+frame terakhir yang dianalisis dilewati, frame terpilih diproses per batch,
+dan hasilnya dirangkum menjadi timeline diagnosis per segmen.
+
+Contoh:
+    python video.py rekaman_baris3.mp4 --sample-fps 2
+    python video.py folder_foto/ --output timeline.json
+"""
+import os
+import io
+import json
+import time
+import zipfile
+import argparse
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+from predict import class_names, predict_batch
+
+VIDEO_EXTENSIONS = {'mp4', 'mov', 'avi', 'mkv', 'webm'}
+SEQUENCE_EXTENSIONS = {'zip', 'gif'}
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+
+
+def allowed_video_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in VIDEO_EXTENSIONS | SEQUENCE_EXTENSIONS
+
+def iter_video_frames(path, sample_fps=2.0):
+    """
+    Yield (index, detik, PIL Image) dari video, hanya frame pada sample_fps
+    """
+    try:
+        import cv2
+    except ImportError:
+        raise RuntimeError("Video input needs OpenCV: pip install opencv-python-headless")
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video {path}")
+
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    step = max(1, int(round(fps / sample_fps))) if sample_fps else 1
+    index = 0
+    try:
+        while capture.grab():
+            # grab() advances without converting; only sampled frames are retrieved
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                yield index, index / fps, Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            index += 1
+    finally:
+        capture.release()
+
+def iter_sequence_frames(path, fps=1.0):
+    """
+    Yield (index, detik, PIL Image) dari folder/zip gambar atau GIF animasi
+    """
+    def is_image(name):
+        return '.' in name and name.rsplit('.', 1)[1].lower() in IMAGE_EXTENSIONS
+
+    if os.path.isdir(path):
+        names = sorted(name for name in os.listdir(path) if is_image(name))
+        for index, name in enumerate(names):
+            with Image.open(os.path.join(path, name)) as image:
+                yield index, index / fps, image.convert('RGB')
+    elif path.lower().endswith('.zip'):
+        if not zipfile.is_zipfile(path):
+            raise ValueError(f"{os.path.basename(path)} is not a zip archive")
+        with zipfile.ZipFile(path) as archive:
+            names = sorted(name for name in archive.namelist() if is_image(name))
+            for index, name in enumerate(names):
+                with Image.open(io.BytesIO(archive.read(name))) as image:
+                    yield index, index / fps, image.convert('RGB')
+    else:
+        with Image.open(path) as image:
+            for index, frame in enumerate(ImageSequence.Iterator(image)):
+                duration = frame.info.get('duration')
+                seconds = index * duration / 1000 if duration else index / fps
+                yield index, seconds, frame.convert('RGB')
+
+def iter_frames(path, sample_fps=2.0):
+    extension = path.rsplit('.', 1)[-1].lower() if '.' in os.path.basename(path) else ''
+    if os.path.isdir(path) or extension in SEQUENCE_EXTENSIONS:
+        return iter_sequence_frames(path)
+    return iter_video_frames(path, sample_fps)
+
+
+class ChangeDetector:
+    """
+    Bandingkan thumbnail grayscale kecil dengan frame terakhir yang dianalisis
+    """
+
+    def __init__(self, threshold=0.04, size=32):
+        self.threshold = threshold
+        self.size = size
+        self._last = None
+
+    def signature(self, image):
+        small = image.convert('L').resize((self.size, self.size), Image.BILINEAR)
+        return np.asarray(small, dtype=np.float32) / 255
+
+    def changed(self, image):
+        signature = self.signature(image)
+        if self._last is not None and np.abs(signature - self._last).mean() < self.threshold:
+            return False
+        self._last = signature
+        return True
+
+
+class Timeline:
+    """
+    Gabungkan frame berurutan dengan kelas yang sama menjadi satu segmen
+    """
+
+    def __init__(self):
+        self.segments = []
+
+    def add(self, seconds, end, predicted_class, confidence, skipped=0):
+        """
+        Tambah satu frame yang dianalisis; end dan skipped mencakup frame
+        mirip setelahnya yang dilewati
+        """
+        last = self.segments[-1] if self.segments else None
+        if last and last['prediction'] == predicted_class:
+            last['end'] = end
+            last['frames'] += 1
+            last['frames_skipped'] += skipped
+            last['confidence_sum'] += confidence
+            last['max_confidence'] = max(last['max_confidence'], confidence)
+            return
+        self.segments.append({
+            'start': seconds,
+            'end': end,
+            'prediction': predicted_class,
+            'frames': 1,
+            'frames_skipped': skipped,
+            'confidence_sum': confidence,
+            'max_confidence': confidence,
+        })
+
+    def extend(self, seconds):
+        # A skipped frame looks like the last analysed one, so it continues
+        # the open segment
+        last = self.segments[-1]
+        last['end'] = seconds
+        last['frames_skipped'] += 1
+
+    def summary(self):
+        return [
+            {
+                'start': round(segment['start'], 2),
+                'end': round(segment['end'], 2),
+                'prediction': segment['prediction'],
+                'frames': segment['frames'],
+                'frames_skipped': segment['frames_skipped'],
+                'mean_confidence': segment['confidence_sum'] / segment['frames'],
+                'max_confidence': segment['max_confidence'],
+            }
+            for segment in self.segments
+        ]
+
+
+def analyze_frames(frames, model, batch_size=8, change_threshold=0.04):
+    """
+    Analisis iterator frame dengan memori terbatas: hanya satu batch frame
+    yang disimpan sekaligus
+    """
+    start = time.perf_counter()
+    detector = ChangeDetector(change_threshold)
+    timeline = Timeline()
+    batch = []
+    frames_total = 0
+    frames_analyzed = 0
+
+    def flush():
+        probabilities = predict_batch([entry['image'] for entry in batch], model, tta_source='video')
+        for entry, probs in zip(batch, probabilities):
+            index = int(probs.argmax())
+            timeline.add(entry['seconds'], entry['end'], class_names[index],
+                         float(probs[index]) * 100, entry['skipped'])
+        batch.clear()
+
+    for _, seconds, image in frames:
+        frames_total += 1
+        if not detector.changed(image):
+            # Credit the skip to the last analysed frame, which may still be
+            # waiting in the batch
+            if batch:
+                batch[-1]['end'] = seconds
+                batch[-1]['skipped'] += 1
+            else:
+                timeline.extend(seconds)
+            continue
+        frames_analyzed += 1
+        batch.append({'seconds': seconds, 'end': seconds, 'skipped': 0, 'image': image})
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    frames_skipped = frames_total - frames_analyzed
+    return {
+        'frames_total': frames_total,
+        'frames_analyzed': frames_analyzed,
+        'frames_skipped': frames_skipped,
+        'skipped_fraction': frames_skipped / frames_total if frames_total else 0.0,
+        'segments': timeline.summary(),
+        'elapsed_ms': (time.perf_counter() - start) * 1000,
+    }
+
+def main():
+    from predict import load_model, load_runtime_config, apply_runtime_config
+
+    parser = argparse.ArgumentParser(description="Diagnosis timeline for a video or image sequence")
+    parser.add_argument('path', help="Video file, GIF, zip of images or folder of images")
+    parser.add_argument('--model', default='best_model.pth')
+    parser.add_argument('--sample-fps', type=float, default=2.0, help="Frames per second to decode from video")
+    parser.add_argument('--change-threshold', type=float, default=0.04,
+                        help="Mean grayscale difference below which a frame is skipped")
+    parser.add_argument('--batch-size', type=int, help="Defaults to the autotuned batch size")
+    parser.add_argument('--output', help="Write the timeline JSON here as well as stdout")
+    args = parser.parse_args()
+
+    runtime_config = load_runtime_config()
+    apply_runtime_config(runtime_config)
+    model = load_model(args.model)
+
+    result = analyze_frames(
+        iter_frames(args.path, args.sample_fps),
+        model,
+        batch_size=args.batch_size or runtime_config.get('batch_size', 8),
+        change_threshold=args.change_threshold,
+    )
+
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+
+if __name__ == "__main__":
+    main()